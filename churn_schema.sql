@@ -0,0 +1,17 @@
+-- Node churn tables. Safe to run against an existing database.
+create table if not exists churnCounts (
+    time_period text not null,
+    country text not null,
+    newNodes integer not null default 0,
+    returns integer not null default 0,
+    departures integer not null default 0,
+    PRIMARY KEY (time_period, country)
+);
+
+create table if not exists churnHistory (
+  ip text not null primary key,
+  country text not null,
+  lastSeen integer not null
+);
+
+create index if not exists churnHistory_lastSeen on churnHistory (lastSeen);
@@ -18,3 +18,7 @@ create table miscStats (
   name text not null primary key,
   value integer not null
 );
+
+-- churn tables are created by churn_schema.sql
+drop table if exists churnCounts;
+drop table if exists churnHistory;
@@ -27,12 +27,19 @@ gi = GeoIP.new(GeoIP.GEOIP_MEMORY_CACHE)
 
 DATABASE_PATH = 'crawler.db'
 
+# Creates the churn tables if they don't exist yet
+CHURN_SCHEMA_PATH = 'churn_schema.sql'
+
 # Smallest time unit (in minutes) for which to store stats
 TIMETICK_INTERVAL = 5
 
 # Key for unknown geolocations
 UNKNOWN_COUNTRY = '??'
 
+# How long (in seconds) an IP is remembered after it was last seen. A node that reappears
+# within this window counts as returning rather than new.
+CHURN_HISTORY_WINDOW = 60 * 60 * 24 * 7
+
 """
 Returns the closest timetick to minute, rounded down. e.g. lowestTimeTick(11) == 10, lowestTimeTick(19) == 15
 """
@@ -46,6 +53,7 @@ class CrawlerStats(object):
 
     def get_db(self):
         db = sqlite3.connect(DATABASE_PATH, timeout=5000)
+        db.executescript(open(CHURN_SCHEMA_PATH, 'r').read())
         return db
 
     """
@@ -98,6 +106,56 @@ class CrawlerStats(object):
         if garbage:
             db.commit()
 
+    """
+    Diffs the IPs in countries (an ip:country dict for the tick at ts) against the tick at prevTs
+    and the churnHistory table, and adds the resulting new node, return and departure counts to
+    the churnCounts table for time_period and every coarser time level. Every country active in
+    either tick gets a row, even if its counts are all zero.
+
+    If there's no usable previous tick (first run, or prevTs is older than CHURN_HISTORY_WINDOW)
+    the tick is only used as a baseline to seed churnHistory and no churn is recorded.
+
+    Returns and departures are events: a node that drops out and comes back several times in
+    the same period is counted each time.
+
+    Runs in time proportional to the size of the current and previous ticks.
+    """
+    def updateChurn(self, db, prevTs, countries, ts, time_period):
+        cutoff = ts - CHURN_HISTORY_WINDOW
+        prevTick = {}
+        if prevTs and prevTs >= cutoff:
+            prevTick = dict(db.execute('SELECT ip, country FROM churnHistory ' +
+                                       'WHERE lastSeen = (?)', (prevTs,)).fetchall())
+
+        db.execute('DELETE FROM churnHistory ' +
+                   'WHERE lastSeen < (?)', (cutoff,))
+
+        churn = {}
+        if prevTick:
+            for c in set(countries.itervalues()) | set(prevTick.itervalues()) | set(['ALL']):
+                churn[c] = {'newNodes': 0, 'returns': 0, 'departures': 0}
+
+            def count(country, key):
+                churn[country][key] += 1
+                churn['ALL'][key] += 1
+
+            for ip, country in prevTick.iteritems():
+                if ip not in countries:
+                    count(country, 'departures')
+
+            for ip, country in countries.iteritems():
+                if ip not in prevTick:
+                    count(country, 'returns' if self.ipInChurnHistory(db, ip) else 'newNodes')
+
+        db.executemany('INSERT OR REPLACE INTO churnHistory ' +
+                       '(ip, country, lastSeen) VALUES (?, ?, ?)',
+                       ((ip, country, ts) for ip, country in countries.iteritems()))
+
+        for country, counts in churn.iteritems():
+            for i in xrange(0, 13, 3):  # magic
+                t = time_period[:-i] if i else time_period
+                self.updateChurnDatabase(db, t, country, counts)
+
     """
     Creates/updates a SQL database containing statistics retreived from crawler logs.
     If cleanup is set to True, this function will delete superfluous logs from
@@ -140,13 +198,17 @@ class CrawlerStats(object):
             if ts <= lastUpdate:
                 continue
 
+            prevUpdate = lastUpdate
             lastUpdate = ts
             db.execute('INSERT OR REPLACE INTO miscStats ' +
                        '(name, value) VALUES (?, ?)',
                        ("lastUpdate", lastUpdate))
 
-            for ip in IPlist:
-                self.update_db(db, Y, m, d, H, tick, ip)
+            countries = dict((ip, self.getCountry(ip)) for ip in IPlist)
+            for ip, country in countries.iteritems():
+                self.update_db(db, Y, m, d, H, tick, ip, country)
+
+            self.updateChurn(db, prevUpdate, countries, ts, "-".join(time_period))
 
             db.commit()
 
@@ -163,11 +225,11 @@ class CrawlerStats(object):
 
         db.close()
 
-    def update_db(self, db, Y, m, d, H, tick, ip):
+    def getCountry(self, ip):
         country = gi.country_code_by_addr(ip)
-        if not country:
-            country = UNKNOWN_COUNTRY
+        return country if country else UNKNOWN_COUNTRY
 
+    def update_db(self, db, Y, m, d, H, tick, ip, country):
         time_period = Y + '-' + m + '-' + d + '-' + H + '-' + tick
         self.updateNodesDatabase(db, time_period, country)
         self.updateNodesDatabase(db, time_period, 'ALL')
@@ -192,6 +254,16 @@ class CrawlerStats(object):
                    '(nodes, time_period, country) VALUES (?, ?, ?)',
                    (numNodes, time_period, country))
 
+    def updateChurnDatabase(self, db, time_period, country, counts):
+        db.execute('INSERT OR IGNORE INTO churnCounts ' +
+                   '(time_period, country) VALUES (?, ?)',
+                   (time_period, country))
+        db.execute('UPDATE churnCounts ' +
+                   'SET newNodes = newNodes + (?), returns = returns + (?), departures = departures + (?) ' +
+                   'WHERE time_period = (?) ' +
+                   'AND country = (?)',
+                   (counts['newNodes'], counts['returns'], counts['departures'], time_period, country))
+
     def addIpDatabase(self, db, ip, time_period):
         db.execute('INSERT INTO ips (ip, time_period) ' +
                    'VALUES (?, ?)',
@@ -207,6 +279,15 @@ class CrawlerStats(object):
                                          'LIMIT 1)',
                                          (ip, time_period)).fetchone()[0]
 
+    """
+    Returns True if ip has been seen within CHURN_HISTORY_WINDOW.
+    """
+    def ipInChurnHistory(self, db, ip):
+        return db.execute('SELECT EXISTS (SELECT 1 FROM churnHistory ' +
+                                         'WHERE ip = (?) ' +
+                                         'LIMIT 1)',
+                                         (ip,)).fetchone()[0]
+
 
 if __name__ == '__main__':
     if (len(argv) != 3):
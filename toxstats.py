@@ -53,12 +53,16 @@ app.config['countryDict']['ALL'] = (u'All Countries', 0, )
 # Map time-level to level-code
 app.config['timeMap'] = { 'Minute': 'M', 'Hour': 'H', 'Day': 'd', 'Month': 'm', 'Year': 'Y', }
 
+# Map chart series to series-code and chart title. Returns and departures count events, not unique nodes
+app.config['seriesMap'] = { 'Unique': ('nodes', 'Unique Tox Nodes'), 'New': ('new', 'New Tox Nodes'),
+                            'Returns': ('returns', 'Tox Node Returns'), 'Departures': ('departures', 'Tox Node Departures'), }
+
 cache = Cache(app, config={'CACHE_TYPE': 'filesystem', 'CACHE_DIR': '/tmp'})
 
 # Cached functions
 @cache.memoize(timeout=60*5)
-def getJsonCharts(countryCodes, level):
-    return util.genChartsJson(g.db, countryCodes, level)
+def getJsonCharts(countryCodes, level, series):
+    return util.genChartsJson(g.db, countryCodes, level, series)
 
 @cache.memoize(timeout=60*5)
 def getJsonCountriesCurrent(countryDict):
@@ -85,6 +89,16 @@ def init_db():
         with app.open_resource('crawler_schema.sql', mode='r') as f:
             db.cursor().executescript(f.read())
         db.commit()
+    migrate_db()
+
+# Creates tables added since crawler_schema.sql was first loaded without touching existing data
+def migrate_db():
+    with closing(connect_db()) as db:
+        with app.open_resource('churn_schema.sql', mode='r') as f:
+            db.cursor().executescript(f.read())
+        db.commit()
+
+migrate_db()
 
 @app.before_request
 def before_request():
@@ -99,9 +113,9 @@ def teardown_request(exception):
 
 COOKIE_SEPARATOR = '|'
 CCODE_SEPARATOR  = '-'
-def makeChartSettingsCookie(chartType, countryCodes, mapType):
+def makeChartSettingsCookie(chartType, countryCodes, mapType, chartSeries):
     countryCodesStr = CCODE_SEPARATOR.join(c for c in countryCodes)
-    return chartType + COOKIE_SEPARATOR + countryCodesStr + COOKIE_SEPARATOR + mapType
+    return chartType + COOKIE_SEPARATOR + countryCodesStr + COOKIE_SEPARATOR + mapType + COOKIE_SEPARATOR + chartSeries
 
 def validCountryCodes(countryCodes):
     if len(countryCodes) > MAX_COUNTRY_SELECTION:
@@ -113,24 +127,24 @@ def validCountryCodes(countryCodes):
 
     return True
 
-def getChartSettings(cookie, timeMap, countryDict):
-    defaults = 'Minute', ['ALL'], 'Current'
+def getChartSettings(cookie, timeMap, seriesMap, countryDict):
+    defaults = 'Minute', ['ALL'], 'Current', 'Unique'
     if not cookie or len(cookie) > 150:
         return defaults
 
     vals = cookie.split(COOKIE_SEPARATOR)
-    if len(vals) != 3:
+    if len(vals) != 4:
         return defaults
 
-    chartType, countryCodes, mapType = vals
-    if chartType not in timeMap or mapType not in ['Current', '24-Hours']:
+    chartType, countryCodes, mapType, chartSeries = vals
+    if chartType not in timeMap or mapType not in ['Current', '24-Hours'] or chartSeries not in seriesMap:
         return defaults
 
     countryCodes = countryCodes.split(CCODE_SEPARATOR)
     if not validCountryCodes(countryCodes):
         return defaults
 
-    return chartType, countryCodes, mapType
+    return chartType, countryCodes, mapType, chartSeries
 
 """
 Parses post data and extracts country codes list.
@@ -143,12 +157,13 @@ def getCountryCodes(post_data):
 @app.route('/', methods=['GET', 'POST'])
 def main_page():
     timeMap = app.config['timeMap']
+    seriesMap = app.config['seriesMap']
 
     countryDict = app.config['countryDict']
     refreshCodeList(countryDict)
 
     cookie = request.cookies.get('chartSettings')
-    chartType, countryCodes, mapType = getChartSettings(cookie, timeMap, countryDict)
+    chartType, countryCodes, mapType, chartSeries = getChartSettings(cookie, timeMap, seriesMap, countryDict)
     level = timeMap[chartType]
 
     if request.method == 'POST':
@@ -157,8 +172,13 @@ def main_page():
             chartType = request.form['chartType']
             if chartType in timeMap:
                 level = timeMap[chartType]
-            if 'countryCode' in post_data:
-                countryCodes = getCountryCodes(post_data)
+
+        if 'chartSeries' in post_data:
+            if request.form['chartSeries'] in seriesMap:
+                chartSeries = request.form['chartSeries']
+
+        if ('chartType' in post_data or 'chartSeries' in post_data) and 'countryCode' in post_data:
+            countryCodes = getCountryCodes(post_data)
 
         if 'mapType' in post_data:
             mapType = request.form['mapType']
@@ -171,8 +191,9 @@ def main_page():
     elif mapType == '24-Hours':
         jsonMap, jsonMapCapita, jsonPie, jsonBarCapita = getJsonCountriesDay(countryDict)
 
-    jsonCharts = getJsonCharts(countryCodes, level)
-    chartTitle = 'Unique Tox Nodes Per %s' % chartType.capitalize()
+    series, seriesTitle = seriesMap[chartSeries]
+    jsonCharts = getJsonCharts(countryCodes, level, series)
+    chartTitle = '%s Per %s' % (seriesTitle, chartType.capitalize())
 
     response = make_response(render_template('index.html',
                                               chartdates=jsonCharts[0],
@@ -189,7 +210,7 @@ def main_page():
                                               jsonBarCapita=jsonBarCapita,
                                               lastUpdate=lastUpdate()))
 
-    cookie_val = makeChartSettingsCookie(chartType, countryCodes, mapType)
+    cookie_val = makeChartSettingsCookie(chartType, countryCodes, mapType, chartSeries)
     response.set_cookie('chartSettings', cookie_val)
     return response
 
@@ -32,6 +32,12 @@ LEVEL_POINTS = {'Y': 100, 'm': 1200, 'd': 1200, 'H': 3031, 'M': 28800, 'all': 28
 
 ALL_COUNTRIES = 'ALL'
 
+# Chart series and the table and column they're read from in the database
+SERIES = {'nodes': ('nodeCounts', 'nodes'),
+          'new': ('churnCounts', 'newNodes'),
+          'returns': ('churnCounts', 'returns'),
+          'departures': ('churnCounts', 'departures')}
+
 """
 Returns the closest timetick to minute, rounded down. e.g. lowestTimeTick(11) == 10, lowestTimeTick(19) == 15
 """
@@ -46,21 +52,26 @@ all specified data points contained in the database.
 @countries A list of two character country code specifying the countries for which to collect data.
 @level Specifies the smallest time level for which to collect data.
   Must be one of the strings from the LEVELS array.
+@series Specifies which count to collect. Must be one of the keys from the SERIES dict:
+  'nodes' for unique nodes, or 'new', 'returns' and 'departures' for node churn. Returns and
+  departures are event counts, not unique nodes. Dates with no churn for a country count as 0.
 
 @return a tuple containing dates, and a list countaining countrycodes and string-formatted node counts.
 """
-def genChartsJson(db, countries=['ALL'], level='all'):
-    if not db or len(countries) > 5 or level not in LEVELS:
+def genChartsJson(db, countries=['ALL'], level='all', series='nodes'):
+    if not db or len(countries) > 5 or level not in LEVELS or series not in SERIES:
         return []
 
-    dataList = []
+    table, column = SERIES[series]
+
+    flatObjs = []
     dateset = set()
     for country in countries:
         if len(country) > 3:
             continue
 
         entries = db.execute('SELECT * FROM ' +
-                             '(SELECT nodes, time_period FROM nodeCounts ' +
+                             '(SELECT ' + column + ', time_period FROM ' + table + ' ' +
                              'WHERE LENGTH(time_period) = (?) ' +
                              'AND country = (?) ' +
                              'LIMIT (?)) sub ' +
@@ -73,6 +84,14 @@ def genChartsJson(db, countries=['ALL'], level='all'):
                 dateset.add(date)
                 flatObj.append({"nodes": entry[0], "label": date})
 
+        flatObjs.append((country, flatObj))
+
+    dataList = []
+    for country, flatObj in flatObjs:
+        if table == 'churnCounts':   # a missing churn row means no churn, keep series aligned with dates
+            labels = set(v['label'] for v in flatObj)
+            flatObj.extend({"nodes": 0, "label": date} for date in dateset - labels)
+
         if level == 'd' or level == 'H' or level == 'm':
             dataList.append((country, sorted(flatObj, key=lambda v: v['label'])[:-1]))
         else: